@@ -1,46 +1,102 @@
 #!/usr/bin/env python3
 
 import os
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
+parent_dir = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
 dhparam_dir = "dhparam"
 dhparam_file = os.path.join(dhparam_dir, "dhparam-2048.pem")
-repos = [{
-    "url": "https://github.com/Kunal19880711/scalarchatterbox.git",
-    "dir": "scalarchatterbox"
-}, {
-    "url": "https://github.com/Kunal19880711/whisperhub.git",
-    "dir": "whisperhub"
-}]
+docker_data_dir = "/var/lib/docker"
+prune_min_free_bytes = 5 * 1024**3
+repo_urls = (
+    "https://github.com/Kunal19880711/scalarchatterbox.git",
+    "https://github.com/Kunal19880711/whisperhub.git",
+)
+
+# RFC 7919 ffdhe2048 group
+ffdhe2048_pem = """-----BEGIN DH PARAMETERS-----
+MIIBCAKCAQEA//////////+t+FRYortKmq/cViAnPTzx2LnFg84tNpWp4TZBFGQz
++8yTnc4kmz75fS/jY2MMddj2gbICrsRhetPfHtXV/WVhJDP1H18GbtCFY2VVPe0a
+87VXE15/V8k1mE8McODmi3fipona8+/och3xWKE2rec1MKzKT0g6eXq8CrGCsyT7
+YdEIqUuyyOP7uWrat2DX9GgdT0Kj3jlN9K5W7edjcrsZCwenyO4KbXCeAvzhzffi
+7MA0BM0oNC9hkXL+nOmFg/+OTxIy7vKBg8P+OxtMb61zO7X8vC7CIAXFjvGDfRaD
+ssbzSibBsu/6iGtCOGEoXJf//////////wIBAg==
+-----END DH PARAMETERS-----
+"""
 
 
 def generate_dhparam():
     """
-    Generates a 2048-bit Diffie-Hellman parameter file in the
+    Writes a 2048-bit Diffie-Hellman parameter file in the
     'dhparam' directory if it does not already exist.
 
     The file is used to configure the SSL/TLS server to use a
-    secure Diffie-Hellman group.
+    secure Diffie-Hellman group. The standardized RFC 7919 ffdhe2048
+    group is written instead of generating a new prime with openssl,
+    which takes minutes of CPU time.
     """
     if not os.path.exists(dhparam_file):
         os.makedirs(dhparam_dir, exist_ok=True)
-        subprocess.run(["openssl", "dhparam", "-out", dhparam_file, "2048"],
-                       check=True)
+        with open(dhparam_file, "w") as file:
+            file.write(ffdhe2048_pem)
+
+
+def run_git(args):
+    """
+    Runs a git command, capturing its output and printing it in one
+    go once the command finishes, so that output of repositories
+    processed concurrently does not get interleaved. The output is
+    also printed when the command fails, before the error is re-raised.
+    """
+    try:
+        result = subprocess.run(["git"] + args,
+                                check=True,
+                                capture_output=True,
+                                text=True)
+    except subprocess.CalledProcessError as e:
+        print(e.stdout + e.stderr, end="")
+        raise
+    print(result.stdout + result.stderr, end="")
+
+
+def get_repo_dir(url):
+    """
+    Returns the directory a repository is cloned into, which is the
+    basename of its URL without the ".git" suffix, as with git clone.
+    """
+    return url.rsplit("/", 1)[1].removesuffix(".git")
+
+
+def clone_or_pull_repo(url):
+    """
+    Clones or pulls the latest version of a single repository.
+
+    Only the tip commit is transferred: the clone is shallow and
+    single-branch, and an existing clone fetches the remote HEAD at
+    depth 1 and hard-resets the working copy onto it.
+    """
+    repo_dir = get_repo_dir(url)
+    if not os.path.exists(repo_dir):
+        run_git(["clone", "--depth=1", "--single-branch", url])
+    else:
+        run_git(["-C", repo_dir, "fetch", "--depth=1", "origin", "HEAD"])
+        run_git(["-C", repo_dir, "reset", "--hard", "FETCH_HEAD"])
 
 
 def clone_or_pull_repos():
     """
     Clones or pulls the latest version of the repositories from
-    the given config.
+    the given URLs.
 
-    If the repository has already been cloned, it will be
-    pulled instead.
+    The repositories are processed concurrently, one thread per
+    repository, since the work is bound by network latency. The
+    first failure is re-raised once all of them have finished.
     """
-    for repo_config in repos:
-        if not os.path.exists(repo_config["dir"]):
-            subprocess.run(["git", "clone", repo_config["url"]], check=True)
-        else:
-            subprocess.run(["git", "pull"], cwd=repo_config["dir"], check=True)
+    with ThreadPoolExecutor(max_workers=len(repo_urls)) as executor:
+        list(executor.map(clone_or_pull_repo, repo_urls))
 
 
 def create_letsencrypt_dir():
@@ -59,25 +115,42 @@ def restart_docker_compose():
     """
     Restarts the Docker Compose services.
 
-    This function removes all existing Docker Compose services
-    and starts them again in detached mode. This is useful for
-    re-deploying the application after making changes to the
-    Docker Compose configuration file.
+    This function brings the Docker Compose services up in detached
+    mode. Compose only recreates the services whose configuration
+    changed and leaves the others running, removes containers of
+    services no longer in the Docker Compose configuration file, and
+    waits until the services are running (or healthy) before returning.
     """
-    subprocess.run(["docker", "compose", "rm", "-fsv"], check=True)
-    subprocess.run(["docker", "compose", "up", "-d"], check=True)
+    subprocess.run(
+        [
+            "docker",
+            "compose",
+            "up",
+            "-d",
+            "--remove-orphans",
+            "--pull=missing",
+            "--wait",
+        ],
+        check=True,
+    )
 
 
 def prune_docker_system():
     """
-    Removes unused Docker images, volumes, networks and build cache.
+    Removes unused Docker resources and build cache older than a week
+    when the disk holding the Docker data directory runs low on space.
 
     This function uses the Docker "system prune" command to remove
-    unused Docker resources. The "-af" flags are used to remove all
-    unused resources (not just those that are dangling) and to force
-    the deletion without prompting the user for confirmation.
+    unused Docker resources. The "-f" flag is used to force the deletion
+    without prompting the user for confirmation. Tagged images are kept
+    and the "until" filter spares recent build cache, so that the next
+    deploy can still reuse cached layers.
     """
-    subprocess.run(["docker", "system", "prune", "-af"], check=True)
+    if shutil.disk_usage(docker_data_dir).free >= prune_min_free_bytes:
+        return
+    subprocess.run(
+        ["docker", "system", "prune", "-f", "--filter", "until=168h"],
+        check=True)
 
 
 def ensure_correct_dir():
@@ -86,9 +159,7 @@ def ensure_correct_dir():
     of the script's location. This ensures that the script is
     executed with the correct working directory context.
     """
-    os.chdir(
-        os.path.abspath(
-            os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+    os.chdir(parent_dir)
 
 
 def main():
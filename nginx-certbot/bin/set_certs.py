@@ -1,49 +1,137 @@
 #!/opt/certbot/bin/python
 
+import argparse
+import asyncio
+import dataclasses
 import os
+import signal
 import subprocess
-import time
 import datetime
+import hashlib
+import logging
+import random
 import socket
-import traceback
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 import yaml
-from jinja2 import Template
+from cryptography import x509
+from inotify_simple import INotify, flags
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
+log = logging.getLogger("set_certs")
+parent_dir = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
 sleep_in_secs = 60
+dns_timeout_in_secs = 2
+dns_cache_ttl_in_secs = 5 * 60
+cert_check_max_delay_in_secs = 24 * 60 * 60
+cert_retry_in_secs = 5 * 60
+# Certbot is only run for a certificate once it expires within this window
+renew_before_expiry = datetime.timedelta(days=30)
+cert_missing = "MISSING"
+cert_expiring = "EXPIRING"
+cert_valid = "VALID"
+letsencrypt_live_dir = "/etc/letsencrypt/live"
+dhparam_file_path = "/etc/ssl/certs/dhparam-2048.pem"
+nginx_pid_file = "/run/nginx.pid"
+nginx_conf_path = "/etc/nginx/conf.d/nginx.conf"
+nginx_tmpl_name = "nginx.conf.jinja"
+certbot_webroot_dir = "/var/www/html"
+certbot_certonly_args = (
+    "certbot",
+    "certonly",
+    "--webroot",
+    "-w",
+    certbot_webroot_dir,
+    "--agree-tos",
+    "-n",
+    "--no-eff-email",
+    "--keep-until-expiring",
+    "--deploy-hook",
+    "nginx -s reload",
+)
+last_render_ctx = None
+# Maps (host, port) to the resolved socket address and its expiry time
+resolved_addresses = {}
+# Long-lived, so that DNS lookups that time out are never joined per tick
+dns_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dns")
+# Digest of the nginx.conf contents last written or found on disk
+last_conf_digest = None
+jinja_bytecode_cache_dir = "/tmp/j2cache"
+# Templates are compiled once per process and their bytecode is cached on
+# disk, so that restarts skip parsing too. Template changes need a restart.
+jinja_env = Environment(
+    loader=FileSystemLoader(os.path.join(parent_dir, "nginx-tmpl")),
+    bytecode_cache=FileSystemBytecodeCache(jinja_bytecode_cache_dir),
+    auto_reload=False,
+    cache_size=-1)
+
+
+@dataclasses.dataclass(frozen=True)
+class DomainRenderContext:
+    """
+    The data of a single domain the nginx configuration template is rendered with.
+    """
+    domain: str
+    server: str
+    is_cert_exists: bool
+    is_server_active: bool
 
 
-def check_if_cert_exists(domain):
+@dataclasses.dataclass(frozen=True)
+class RenderContext:
     """
-    Checks if the SSL certificate and private key files exist for the specified domain.
-
-    The function retrieves the domain from the environment variables and constructs
-    the paths to the certificate and key files in the Let's Encrypt directory.
-    It returns True if both files exist, indicating that the certificate is present,
-    otherwise it returns False.
+    The data the nginx configuration template is rendered with. Being frozen,
+    two contexts can be compared to tell whether rendering can be skipped.
     """
-    cert_file_path = os.path.join("/etc/letsencrypt/live", domain,
-                                  "fullchain.pem")
-    cert_key_file_path = os.path.join("/etc/letsencrypt/live", domain,
-                                      "privkey.pem")
-    return os.path.exists(cert_file_path) and os.path.exists(
-        cert_key_file_path)
+    is_dhparam_available: bool
+    domains: tuple
 
 
 def check_if_dhparam_available():
     """
     Checks if the dhparam file exists in the /etc/ssl/certs directory.
     """
-    dhparam_file_path = "/etc/ssl/certs/dhparam-2048.pem"
     return os.path.exists(dhparam_file_path)
 
 
-def check_server_active(url):
+async def resolve_address(host, port):
+    """
+    Resolves the host and port to an IPv4 socket address within
+    `dns_timeout_in_secs` seconds, without blocking the event loop.
+
+    The lookup runs on `dns_executor` rather than the loop's default
+    executor. On a timeout the lookup keeps running in its thread, and
+    `asyncio.run` would wait for it when joining the default executor.
+    Resolved addresses are cached for `dns_cache_ttl_in_secs` seconds.
+    """
+    now = time.monotonic()
+    cached = resolved_addresses.get((host, port))
+    if cached and cached[1] > now:
+        return cached[0]
+
+    loop = asyncio.get_running_loop()
+    addr_infos = await asyncio.wait_for(
+        loop.run_in_executor(dns_executor, socket.getaddrinfo, host, port,
+                             socket.AF_INET, socket.SOCK_STREAM),
+        timeout=dns_timeout_in_secs,
+    )
+    address = addr_infos[0][4]
+    resolved_addresses[(host, port)] = (address, now + dns_cache_ttl_in_secs)
+    return address
+
+
+async def check_server_active(url):
     """
-    Checks if the server is active by attempting to resolve the hostname
-    specified in the URL to an IP address. If the hostname is resolvable, it
-    indicates that the server is active and running. If the hostname is not
-    resolvable, it indicates that the server is not running.
+    Checks if the server is active by attempting to open a TCP connection
+    to the host and port specified in the URL within 1 second. If the
+    connection succeeds, it indicates that the server is active and running.
+    Otherwise, it indicates that the server is not running.
+
+    The hostname is resolved beforehand with its own timeout and through a
+    cache, so that DNS lookups do not eat into the connection timeout.
 
     Returns:
         bool: True if the server is active, False otherwise.
@@ -52,27 +140,136 @@ def check_server_active(url):
     host, port = parsed_url.netloc.split(":")
     port = int(port)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(1)  # set a timeout of 1 second
-        result = sock.connect_ex((host, port))
-        sock.close()
-        return result == 0
+        ip, _ = await resolve_address(host, port)
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port),
+                                           timeout=1)
+        writer.close()
+        await writer.wait_closed()
+        return True
+    except (ConnectionError, asyncio.TimeoutError):
+        # A recreated container may have a new IP, so resolve it again on
+        # the next probe instead of retrying the cached address.
+        resolved_addresses.pop((host, port), None)
+        return False
     except Exception as e:
-        print(f"Exception occurred while checking if server is active: {e}")
+        log.warning(
+            "Exception occurred while checking if server is active: %s", e)
         return False
 
 
+async def check_servers_active(urls):
+    """
+    Checks concurrently if the servers at the given URLs are active.
+
+    Returns:
+        list: A bool per URL, in the same order as the URLs.
+    """
+    return await asyncio.gather(*(check_server_active(url) for url in urls))
+
+
+def get_conf_digest(conf):
+    """
+    Returns the BLAKE2b digest of the given configuration contents.
+    """
+    return hashlib.blake2b(conf.encode("utf-8"), digest_size=16).digest()
+
+
 def check_nginx_conf_change(file_path, new_conf):
     """
-    Reads the contents of the nginx.conf file.
+    Checks if the contents of the nginx.conf file differ from the new
+    configuration.
+
+    If the new configuration matches the one this script last wrote or found
+    in the file, the file is not touched at all. Otherwise the file sizes are
+    compared first, and only when both have the same size is the file hashed
+    chunk by chunk and compared with the digest of the new configuration.
     """
-    if not os.path.exists(file_path):
+    new_digest = get_conf_digest(new_conf)
+    if new_digest == last_conf_digest:
+        return False
+
+    try:
+        file_size = os.stat(file_path).st_size
+    except FileNotFoundError:
+        return True
+
+    if file_size != len(new_conf.encode("utf-8")):
         return True
 
-    with open(file_path) as nginx_conf_file:
-        old_conf = nginx_conf_file.read()
+    old_digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as nginx_conf_file:
+        for chunk in iter(lambda: nginx_conf_file.read(65536), b""):
+            old_digest.update(chunk)
+
+    return old_digest.digest() != new_digest
+
+
+def write_file_atomically(file_path, contents):
+    """
+    Writes the contents to the file so that readers see either the old or
+    the new contents, never a partially written file.
+
+    The contents are written and fsynced to a temporary file in the same
+    directory, which then replaces the file. The temporary file is removed
+    if anything fails before that.
+    """
+    fd, tmp_file_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path),
+        prefix=f".{os.path.basename(file_path)}.",
+        suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(contents.encode("utf-8"))
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.chmod(tmp_file_path, 0o644)
+        os.replace(tmp_file_path, file_path)
+    except BaseException:
+        os.unlink(tmp_file_path)
+        raise
+
+
+def run_nginx_reload():
+    """
+    Runs `nginx -s reload`.
+
+    The command is started with posix_spawn where available, which skips the
+    pipe and preexec plumbing of subprocess, and falls back to subprocess
+    otherwise. If the command fails, the function raises a CalledProcessError
+    exception.
+    """
+    args = ["nginx", "-s", "reload"]
+    if not hasattr(os, "posix_spawnp"):
+        subprocess.run(args, check=True)
+        return
+
+    pid = os.posix_spawnp(args[0], args, os.environ)
+    _, status = os.waitpid(pid, 0)
+    returncode = os.waitstatus_to_exitcode(status)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, args)
+
+
+def reload_nginx():
+    """
+    Reloads the nginx server configuration by sending SIGHUP to the nginx
+    master process, whose PID is read from the nginx PID file.
+
+    If the PID file does not exist yet or is empty, it falls back to
+    `nginx -s reload`. If the master process is not running, nothing is done,
+    as nginx picks up the new configuration when it starts.
+    """
+    try:
+        with open(nginx_pid_file) as pid_file:
+            pid = int(pid_file.read().strip())
+    except (FileNotFoundError, ValueError):
+        run_nginx_reload()
+        return
 
-    return old_conf != new_conf
+    try:
+        os.kill(pid, signal.SIGHUP)
+    except ProcessLookupError:
+        log.warning("nginx master process [%s] is not running.", pid)
 
 
 def set_nginx(config):
@@ -88,153 +285,168 @@ def set_nginx(config):
     the domain and enable_https data, and writes the rendered template to the
     /etc/nginx/conf.d/nginx.conf file. Finally, it reloads the nginx server configuration.
     """
-    tmpl_file_path = os.path.join("nginx-tmpl", "nginx.conf.jinja")
-    nginx_conf_path = os.path.abspath("/etc/nginx/conf.d/nginx.conf")
     is_dhparam_available = check_if_dhparam_available()
 
-    for domain_config in config["domains"]:
-        domain_config["is_server_active"] = check_server_active(
-            domain_config["server"])
-
-    data = {
-        "is_dhparam_available": is_dhparam_available,
-        "domains": config["domains"]
-    }
-    print(data)
+    # Probe all servers concurrently, since each probe may block for up
+    # to its connect timeout.
+    servers = [domain_config["server"] for domain_config in config["domains"]]
+    for domain_config, is_server_active in zip(
+            config["domains"], asyncio.run(check_servers_active(servers))):
+        domain_config["is_server_active"] = is_server_active
+
+    render_ctx = RenderContext(
+        is_dhparam_available=is_dhparam_available,
+        domains=tuple(
+            DomainRenderContext(
+                domain=domain_config["domain"],
+                server=domain_config["server"],
+                is_cert_exists=domain_config["is_cert_exists"],
+                is_server_active=domain_config["is_server_active"],
+            ) for domain_config in config["domains"]),
+    )
+    log.debug("nginx template data: %s", render_ctx)
 
-    with open(tmpl_file_path) as tmpl_file:
-        template = Template(tmpl_file.read())
+    # Skip rendering when the data did not change since the last call.
+    global last_render_ctx, last_conf_digest
+    if render_ctx == last_render_ctx:
+        return
 
-    new_conf = template.render(data)
+    new_conf = jinja_env.get_template(nginx_tmpl_name).render(
+        dataclasses.asdict(render_ctx))
 
     if check_nginx_conf_change(nginx_conf_path, new_conf):
-        with open(nginx_conf_path, "w") as nginx_conf_file:
-            nginx_conf_file.write(new_conf)
-        subprocess.run(["nginx", "-s", "reload"], check=True)
+        write_file_atomically(nginx_conf_path, new_conf)
+        reload_nginx()
+    last_conf_digest = get_conf_digest(new_conf)
+    last_render_ctx = render_ctx
 
 
-def check_certificate_validity():
+def get_cert_state(domain):
     """
-    Check if the current certificate is valid using Certbot.
-    """
-    try:
-        # Run Certbot command to check certificate validity
-        output = subprocess.check_output(["certbot", "certificates"])
-        # Parse output to get certificate expiration date
-        for line in output.decode("utf-8").splitlines():
-            if "Expires" in line:
-                expiration_date = line.split(":")[1].strip()
-                # Check if certificate is valid (i.e., not expired)
-                expiration_date = datetime.datetime.strptime(
-                    expiration_date, "%Y-%m-%d %H:%M:%S%z")
-                if expiration_date > datetime.datetime.now():
-                    return True
-
-        return False
-    except subprocess.CalledProcessError as e:
-        print(f"Error checking certificate validity: {e}")
-        return False
+    Gets the state of the SSL certificate for the specified domain.
 
+    The function reads the domain's fullchain.pem in the Let's Encrypt live directory,
+    whose first certificate is the domain's own, so that a single open tells both
+    whether the certificate is present and when it expires. It also checks that
+    the domain's privkey.pem exists.
 
-def renew_cert(email):
+    Returns:
+        tuple: The state, which is `cert_missing` if either file does not exist,
+            `cert_expiring` if the certificate cannot be read or expires within
+            `renew_before_expiry`, and `cert_valid` otherwise, along with the
+            expiration date, or None if the certificate cannot be read.
     """
-    Renews the SSL certificate for the domains that need certificate renewal using Certbot.
+    cert_dir = os.path.join(letsencrypt_live_dir, domain)
+    if not os.path.exists(os.path.join(cert_dir, "privkey.pem")):
+        return cert_missing, None
 
-    The --non-interactive flag is used to prevent Certbot from asking user
-    questions. The --agree-tos flag is used to agree to the terms of service.
-    The --email flag is used to specify the contact email address for the
-    certificate.
+    cert_file_path = os.path.join(cert_dir, "fullchain.pem")
+    try:
+        with open(cert_file_path, "rb") as cert_file:
+            cert = x509.load_pem_x509_certificate(cert_file.read())
+    except FileNotFoundError:
+        return cert_missing, None
+    except (OSError, ValueError) as e:
+        log.error("Error reading certificate: %s", e)
+        return cert_expiring, None
+
+    expiry = cert.not_valid_after_utc
+    renew_after = datetime.datetime.now(
+        datetime.timezone.utc) + renew_before_expiry
+    if expiry > renew_after:
+        return cert_valid, expiry
+    return cert_expiring, expiry
+
+
+def update_cert_state(domain_config):
+    """
+    Stores the state of the SSL certificate of the domain in its config, as
+    `is_cert_exists` and `cert_expiry`, and returns the state.
 
-    The function runs the Certbot renew command with the given flags and
-    checks the return code of the command. If the command fails, the function
-    raises a CalledProcessError exception.
+    The certificate only counts as existing when its key file exists and the
+    certificate could be parsed, so that nginx is never pointed at a broken
+    or missing certificate or key.
     """
-    subprocess.run(
-        [
-            "certbot",
-            "renew",
-            "-n",
-            "--agree-tos",
-            "--email",
-            email,
-        ],
-        check=True,
-    )
+    state, domain_config["cert_expiry"] = get_cert_state(
+        domain_config["domain"])
+    domain_config["is_cert_exists"] = domain_config["cert_expiry"] is not None
+    return state
 
 
-def obtain_cert(email, domains):
+def obtain_cert(email, domain):
     """
-    Obtains the SSL certificate for the domains needed certificate using Certbot.
-
-    The --nginx flag is used to configure the Nginx web server.
+    Obtains or renews the SSL certificate for the specified domain using Certbot.
+
+    The --webroot flag is used to answer the ACME challenge by writing files
+    into the webroot directory, which nginx serves under /.well-known/acme-challenge,
+    so that Certbot does not need to parse and modify the nginx configuration.
+    As the webroot authenticator does not reload nginx, the --deploy-hook flag
+    makes Certbot reload it after each issued or renewed certificate, so that
+    nginx loads the new certificate even when its configuration is unchanged.
     The --non-interactive flag is used to prevent Certbot from asking user
     questions. The --agree-tos flag is used to agree to the terms of service.
     The --email flag is used to specify the contact email address for the
-    certificate.
+    certificate. The --keep-until-expiring flag makes Certbot renew an
+    existing certificate only when it is due, so that the same invocation
+    covers both a missing and an expiring certificate. The --cert-name flag
+    pins the certificate to the lineage named after the domain, which is the
+    one read from the Let's Encrypt live directory, instead of letting Certbot
+    pick or create another lineage.
 
     The function runs the Certbot certonly command with the given flags and
     checks the return code of the command. If the command fails, the function
     raises a CalledProcessError exception.
     """
     args = [
-        "certbot",
-        "certonly",
-        "--nginx",
+        *certbot_certonly_args,
         "--email",
         email,
-        "--agree-tos",
-        "-n",
-        "--no-eff-email",
+        "--cert-name",
+        domain,
+        "-d",
+        domain,
+        "-d",
+        f"www.{domain}",
     ]
-    for domain in domains:
-        args.extend([
-            "-d",
-            domain,
-            "-d",
-            "www." + domain,
-        ])
     subprocess.run(
         args=args,
         check=True,
     )
 
 
-def setup_certs(config):
+def setup_certs(config, obtain_certs=True):
     """
     Sets up the SSL certificates for the specified domains.
 
-    This function checks if the SSL certificates and key files exist for each domain.
-    If the certificates and key files exist, it sets up the Nginx server to use them.
-    If the certificates and key files do not exist, it runs the Certbot certonly command to
-    obtain the certificates and sets up the Nginx server to use them.
-
-    It also checks the validity of the certificates and renews them if they are not valid.
+    This function checks the state of the SSL certificate for each domain.
+    If the certificates exist, it sets up the Nginx server to use them.
+    If the certificates do not exist, or are about to expire, and
+    `obtain_certs` is set, it runs the Certbot certonly command for each of
+    those domains to obtain or renew the certificates and sets up the Nginx
+    server to use them.
     """
     domains_need_cert = []
     for domain_config in config["domains"]:
-        domain_config["is_cert_exists"] = check_if_cert_exists(
-            domain_config["domain"])
-        if not domain_config["is_cert_exists"]:
+        if update_cert_state(domain_config) != cert_valid:
             domains_need_cert.append(domain_config["domain"])
 
     set_nginx(config)
 
-    if not check_certificate_validity():
-        renew_cert(config["email"])
-
-    if not domains_need_cert:
+    if not obtain_certs or not domains_need_cert:
         return
 
-    obtain_cert(email=config["email"], domains=domains_need_cert)
+    for domain in domains_need_cert:
+        obtain_cert(email=config["email"], domain=domain)
     for domain_config in config["domains"]:
         domain = domain_config["domain"]
-        domain_config["is_cert_exists"] = check_if_cert_exists(domain)
+        update_cert_state(domain_config)
         if domain_config["is_cert_exists"]:
-            print(
-                f"Certificates are generated successfully for domain [{domain}]."
-            )
+            log.info(
+                "Certificates are generated successfully for domain [%s].",
+                domain)
         else:
-            print(f"failed to generate certificates for domain [{domain}].")
+            log.error("failed to generate certificates for domain [%s].",
+                      domain)
 
     set_nginx(config)
 
@@ -245,9 +457,7 @@ def ensure_correct_dir():
     of the script's location. This ensures that the script is
     executed with the correct working directory context.
     """
-    os.chdir(
-        os.path.abspath(
-            os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")))
+    os.chdir(parent_dir)
 
 
 def load_yaml_config(file_path):
@@ -264,21 +474,123 @@ def load_yaml_config(file_path):
         return yaml.safe_load(file)
 
 
-def main():
+def reload_config(file_path, last_config):
+    """
+    Reloads the YAML configuration file, falling back to the last good
+    configuration.
+
+    A config.yaml caught in the middle of an edit may be unreadable, not be
+    valid YAML, or not be a mapping with a list of domains; the error is
+    logged and `last_config` is returned instead, so that the loop keeps
+    running with the last good configuration until the file is fixed.
+
+    Returns:
+        dict: The reloaded configuration, or `last_config`, which is None
+            if no good configuration was loaded yet.
+    """
+    try:
+        config = load_yaml_config(file_path)
+    except (OSError, yaml.YAMLError) as e:
+        log.error("Error loading config [%s]: %s", file_path, e)
+        return last_config
+    domains = config.get("domains") if isinstance(config, dict) else None
+    if not isinstance(domains, list):
+        log.error("Config [%s] is not a mapping with a list of domains.",
+                  file_path)
+        return last_config
+    return config
+
+
+def get_cert_check_delay_in_secs(config):
+    """
+    Returns how long to wait before running Certbot for the domains again.
+
+    The delay is anchored to the earliest certificate renewal,
+    `renew_before_expiry` before expiry plus up to an hour of jitter, and
+    capped by a daily check. A domain without a readable certificate, or
+    whose renewal is already due, is retried after `cert_retry_in_secs`
+    seconds.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    delay_in_secs = cert_check_max_delay_in_secs
+    for domain_config in config["domains"]:
+        expiry = domain_config.get("cert_expiry")
+        if expiry is None:
+            delay_in_secs = min(delay_in_secs, cert_retry_in_secs)
+        else:
+            renew_in_secs = (expiry - renew_before_expiry -
+                             now).total_seconds() + random.uniform(0, 3600)
+            delay_in_secs = min(delay_in_secs,
+                                max(cert_retry_in_secs, renew_in_secs))
+    return delay_in_secs
+
+
+def parse_args():
+    """
+    Parses the command-line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Sets up the SSL certificates and the nginx configuration."
+    )
+    parser.add_argument(
+        "--oneshot",
+        action="store_true",
+        help="set up the certificates once and exit, for running the script "
+        "from a scheduler such as cron or a systemd timer")
+    return parser.parse_args()
+
+
+def main(oneshot=False):
     """
     Ensures the correct directory context and sets up the SSL certificates.
+
+    Unless `oneshot` is set, the setup is repeated whenever config.yaml is
+    written to, a file is written or moved into the Let's Encrypt live
+    directory, or `sleep_in_secs` seconds elapse, so that the servers are
+    probed and the nginx configuration follows them. config.yaml is reloaded
+    on every wakeup, keeping the last good configuration while it cannot be
+    loaded. Certbot only runs once the certificate check delay has
+    elapsed, or config.yaml has changed.
     """
     ensure_correct_dir()
-    config = load_yaml_config(
-        os.path.abspath(os.path.join(os.getcwd(), "config.yaml")))
+    config_path = os.path.abspath(os.path.join(os.getcwd(), "config.yaml"))
+    os.makedirs(letsencrypt_live_dir, exist_ok=True)
+    os.makedirs(jinja_bytecode_cache_dir, exist_ok=True)
+    if oneshot:
+        setup_certs(load_yaml_config(config_path))
+        return
+
+    inotify = INotify()
+    # config.yaml is bind-mounted as a single file, so it is watched itself;
+    # writes made on the host do not show up on its container directory.
+    config_watch = inotify.add_watch(config_path,
+                                     flags.CLOSE_WRITE | flags.MODIFY)
+    inotify.add_watch(letsencrypt_live_dir,
+                      flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+    config = None
+    next_cert_check = time.monotonic()
     while True:
-        setup_certs(dict(config))
-        time.sleep(sleep_in_secs)
+        config = reload_config(config_path, config)
+        if config is None:
+            inotify.read(timeout=sleep_in_secs * 1000, read_delay=1000)
+            continue
+        is_cert_check_due = time.monotonic() >= next_cert_check
+        setup_certs(config, obtain_certs=is_cert_check_due)
+        if is_cert_check_due:
+            next_cert_check = time.monotonic() + get_cert_check_delay_in_secs(
+                config)
+        events = inotify.read(timeout=sleep_in_secs * 1000, read_delay=1000)
+        if any(event.wd == config_watch for event in events):
+            next_cert_check = time.monotonic()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+    args = parse_args()
     try:
-        main()
+        main(oneshot=args.oneshot)
     except Exception as e:
-        print(f"An error occurred: {e}")
-        traceback.print_exc()
+        log.exception("An error occurred: %s", e)